@@ -4,39 +4,114 @@ FastAPI Backend for Pest Infestation Forecaster
 
 import os
 import sys
+import asyncio
+import concurrent.futures
+import functools
+import io
+import aiofiles
+import numpy as np
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, EmailStr
 from PIL import Image
 import json
+import time
 from datetime import datetime
 
+# Response timestamps are cosmetic — re-format only when the integer
+# second rolls over instead of formatting a fresh datetime per hit
+_ts_cache = [0, ""]
+
+
+def now_iso():
+    t = int(time.time())
+    if t != _ts_cache[0]:
+        _ts_cache[0] = t
+        _ts_cache[1] = datetime.fromtimestamp(t).isoformat()
+    return _ts_cache[1]
+
+
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import Config
 from scripts.weather_data import WeatherDataFetcher
 from scripts.pest_detector import PestDetector
+from scripts.pdf_report import PestReportGenerator
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Pest Infestation Forecaster API",
     description="AI-powered pest forecasting for agriculture",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # Rust-backed JSON encoding
 )
 
-# Enable CORS for frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, specify your frontend URL
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Enable CORS for frontend — a hand-rolled ASGI layer with precomputed
+# header bytes instead of the full CORSMiddleware stack on every request
+ALLOWED_ORIGIN = os.getenv('CORS_ALLOW_ORIGIN', '*')  # In production, set your frontend URL
+
+_CORS_HEADERS = [
+    (b'access-control-allow-origin', ALLOWED_ORIGIN.encode()),
+    (b'access-control-allow-credentials', b'true'),
+]
+_PREFLIGHT_HEADERS = _CORS_HEADERS + [
+    (b'access-control-allow-methods', b'*'),
+    (b'access-control-allow-headers', b'*'),
+    (b'access-control-max-age', b'600'),
+]
+
+
+class LeanCORS:
+    """Minimal CORS: early 204 on preflight, two headers on everything else"""
+    # The parameter must be named `app`: starlette builds the middleware
+    # stack with cls(app=app, ...) on the pinned 0.35.x line
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        if scope['method'] == 'OPTIONS':
+            await send({'type': 'http.response.start', 'status': 204,
+                        'headers': _PREFLIGHT_HEADERS})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        async def send_with_cors(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message['headers']) + _CORS_HEADERS
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+
+app.add_middleware(LeanCORS)
+
+# Uploads root resolved once at import; every client-supplied filename
+# is validated against it instead of re-joining and re-checking per call
+UPLOAD_ROOT = os.path.realpath(Config.DATA_UPLOADS)
+
+
+@functools.lru_cache(maxsize=256)
+def resolve_upload(filename):
+    """Resolve a filename inside the uploads dir, rejecting path traversal"""
+    path = os.path.realpath(os.path.join(UPLOAD_ROOT, filename))
+    if not path.startswith(UPLOAD_ROOT + os.sep):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    return path
+
 
 # Initialize models
 weather_fetcher = WeatherDataFetcher()
 pest_detector = PestDetector()
+report_generator = PestReportGenerator()
+
+# Shared pool so CPU-bound model calls and blocking I/O run off the
+# event loop thread instead of queueing every other request behind them
+EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=4)
 
 # Load trained model
 try:
@@ -46,13 +121,21 @@ except Exception as e:
     print(f"⚠️  Could not load model: {e}")
 
 
+@app.on_event("startup")
+async def warm_up_model():
+    """Pay TF's one-time graph build cost at startup, not on the first request"""
+    if pest_detector.model is not None or pest_detector._has_tflite:
+        await asyncio.to_thread(pest_detector.warm_up)
+        print("✅ Model warmed up")
+
+
 @app.get("/")
 async def root():
     """API Health Check"""
     return {
         "status": "online",
         "message": "Pest Infestation Forecaster API",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     }
 
 
@@ -62,14 +145,14 @@ async def get_weather():
     Fetch current weather forecast
     """
     try:
-        # Fetch weather data
-        weather_data = weather_fetcher.fetch_forecast(days=3)
+        # Fetch weather data (async client, cached for 15 minutes)
+        weather_data = await weather_fetcher.fetch_forecast(days=3)
         
         if weather_data:
             # Process it
             processed = weather_fetcher.process_weather(weather_data)
             
-            return JSONResponse({
+            return {
                 "success": True,
                 "data": {
                     "location": {
@@ -77,9 +160,9 @@ async def get_weather():
                         "longitude": Config.FARM_LON
                     },
                     "forecast": processed,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": now_iso()
                 }
-            })
+            }
         else:
             raise HTTPException(status_code=500, detail="Failed to fetch weather data")
             
@@ -98,21 +181,34 @@ async def upload_drone_image(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="File must be an image")
         
         # Save uploaded file
-        upload_path = os.path.join(Config.DATA_UPLOADS, file.filename)
-        
-        with open(upload_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Verify image can be opened
+        upload_path = resolve_upload(file.filename)
+
+        # Parse the image header from the first chunk in memory so bad
+        # uploads are rejected before anything touches disk — no second
+        # decode pass and no os.remove cleanup branch
+        first_chunk = await file.read(1 << 20)
         try:
-            img = Image.open(upload_path)
+            # Dimensions come straight from the header — no pixel decode
+            img = Image.open(io.BytesIO(first_chunk))
             img_size = img.size
-        except Exception as e:
-            os.remove(upload_path)
+            if len(first_chunk) < (1 << 20):
+                # Whole file fits in the first chunk — run the cheap
+                # integrity scan too (it needs the complete byte stream)
+                img.verify()
+        except Exception:
             raise HTTPException(status_code=400, detail="Invalid image file")
+
+        # Stream to disk in 1 MiB chunks so large drone images neither
+        # buffer fully in RAM nor block the event loop on the write
+        async with aiofiles.open(upload_path, "wb") as out:
+            await out.write(first_chunk)
+            while True:
+                chunk = await file.read(1 << 20)
+                if not chunk:
+                    break
+                await out.write(chunk)
         
-        return JSONResponse({
+        return {
             "success": True,
             "data": {
                 "filename": file.filename,
@@ -120,7 +216,7 @@ async def upload_drone_image(file: UploadFile = File(...)):
                 "size": img_size,
                 "message": "Image uploaded successfully"
             }
-        })
+        }
         
     except HTTPException:
         raise
@@ -134,25 +230,28 @@ async def detect_pests(filename: str):
     Run pest detection on uploaded image
     """
     try:
-        image_path = os.path.join(Config.DATA_UPLOADS, filename)
+        image_path = resolve_upload(filename)
         
         if not os.path.exists(image_path):
             raise HTTPException(status_code=404, detail="Image not found")
         
-        # Run pest detection
-        result = pest_detector.predict_image(image_path)
+        # Run pest detection off the event loop
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            EXECUTOR, pest_detector.predict_image, image_path
+        )
         
         if result is None:
             raise HTTPException(status_code=500, detail="Pest detection failed")
         
-        return JSONResponse({
+        return {
             "success": True,
             "data": {
                 "filename": filename,
                 "detection_result": result,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso()
             }
-        })
+        }
         
     except HTTPException:
         raise
@@ -166,36 +265,39 @@ async def create_pest_map(filename: str):
     Create a full pest infestation map from uploaded image
     """
     try:
-        image_path = os.path.join(Config.DATA_UPLOADS, filename)
+        image_path = resolve_upload(filename)
         
         if not os.path.exists(image_path):
             raise HTTPException(status_code=404, detail="Image not found")
         
-        # Create pest map
-        pest_map = pest_detector.create_pest_map(image_path, patch_size=64)
+        # Create pest map off the event loop
+        loop = asyncio.get_running_loop()
+        pest_map = await loop.run_in_executor(
+            EXECUTOR, functools.partial(pest_detector.create_pest_map, image_path, patch_size=64)
+        )
         
         if pest_map is None:
             raise HTTPException(status_code=500, detail="Pest map creation failed")
         
-        # Calculate statistics
+        # Calculate statistics in one pass, no boolean mask kept around
         total_patches = pest_map.size
-        infected_patches = (pest_map > 0.5).sum()
-        infection_rate = (infected_patches / total_patches) * 100
+        infected_patches = int(np.count_nonzero(pest_map > 0.5))
+        infection_rate = round(infected_patches * 100.0 / total_patches, 2)
         
-        return JSONResponse({
+        return {
             "success": True,
             "data": {
                 "filename": filename,
                 "map_shape": pest_map.shape,
                 "statistics": {
                     "total_patches": int(total_patches),
-                    "infected_patches": int(infected_patches),
-                    "infection_rate": round(infection_rate, 2)
+                    "infected_patches": infected_patches,
+                    "infection_rate": infection_rate
                 },
                 "map_file": "pest_map.npy",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso()
             }
-        })
+        }
         
     except HTTPException:
         raise
@@ -224,25 +326,45 @@ async def get_pest_forecast():
                 "recommended_action": "Monitor closely" if day == 1 else "Consider preventive treatment"
             })
         
-        return JSONResponse({
+        # Current infestation level from the last pest map, memory-mapped
+        # so only the pages the reduction touches are paged in
+        current_infection_rate = None
+        pest_map = pest_detector.load_pest_map()
+        if pest_map is not None:
+            infected = int(np.count_nonzero(pest_map > 0.5))
+            current_infection_rate = round(infected * 100.0 / pest_map.size, 2)
+        
+        return {
             "success": True,
             "data": {
                 "forecast": forecast,
-                "timestamp": datetime.now().isoformat()
+                "current_infection_rate": current_infection_rate,
+                "timestamp": now_iso()
             }
-        })
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Email alert endpoints
+class AlertSetup(BaseModel):
+    email: EmailStr
+    enabled: bool = True
+
+
+class AlertMessage(BaseModel):
+    email: EmailStr
+    subject: str
+    message: str
+
+
 @app.post("/api/setup-alerts")
-async def setup_alerts(request: dict):
+async def setup_alerts(request: AlertSetup):
     """Setup email alerts for user"""
     try:
-        email = request.get("email")
-        enabled = request.get("enabled", True)
+        email = request.email
+        enabled = request.enabled
         
         print(f"\n📧 Email alerts enabled for: {email}")
         
@@ -256,12 +378,12 @@ async def setup_alerts(request: dict):
 
 
 @app.post("/api/send-alert")
-async def send_alert(request: dict):
+async def send_alert(request: AlertMessage):
     """Send email alert (logs to console for now)"""
     try:
-        recipient = request.get("email")
-        subject = request.get("subject")
-        message = request.get("message")
+        recipient = request.email
+        subject = request.subject
+        message = request.message
         
         # Log the alert to console
         print(f"\n{'='*60}")
@@ -291,19 +413,24 @@ async def send_alert(request: dict):
 @app.get("/api/generate-report")
 async def generate_pdf_report():
     """
-    Generate comprehensive PDF report (simplified version)
+    Generate comprehensive PDF report and stream it back
     """
     try:
-        # For now, return a success message
-        # In production, you would generate actual PDF using reportlab
-        return JSONResponse({
-            "success": True,
-            "message": "PDF generation feature - Install reportlab to enable",
-            "data": {
-                "note": "Run: pip install reportlab",
-                "timestamp": datetime.now().isoformat()
-            }
-        })
+        # Include the current weather forecast when available
+        weather_data = await weather_fetcher.fetch_forecast(days=3)
+        processed = weather_fetcher.process_weather(weather_data) if weather_data else None
+        
+        # Build the PDF in memory — it never hits disk on the download path
+        filename, pdf_bytes = await asyncio.to_thread(
+            report_generator.build_pdf,
+            {'forecast': processed} if processed else None
+        )
+        
+        return StreamingResponse(
+            io.BytesIO(pdf_bytes),
+            media_type="application/pdf",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -318,4 +445,11 @@ if __name__ == "__main__":
     print("📖 Docs available at: http://localhost:8000/docs")
     print("="*60 + "\n")
     
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(
+        "api.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WORKERS", os.cpu_count()))
+    )
\ No newline at end of file
@@ -3,6 +3,7 @@ PDF Report Generator
 Creates detailed pest infestation report
 """
 
+import io
 import os
 import sys
 from datetime import datetime
@@ -22,42 +23,87 @@ class PestReportGenerator:
     def __init__(self):
         self.output_dir = os.path.join(Config.BASE_DIR, 'data', 'reports')
         os.makedirs(self.output_dir, exist_ok=True)
-        
-    def generate_report(self, weather_data=None, detection_result=None, forecast_data=None):
-        """
-        Generate comprehensive PDF report
-        """
-        # Create filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"pest_report_{timestamp}.pdf"
-        filepath = os.path.join(self.output_dir, filename)
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(filepath, pagesize=letter)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
+
+        # Styles are immutable across reports — build them once here
+        # instead of re-deriving the sample stylesheet on every call
+        self.styles = getSampleStyleSheet()
+
+        self.title_style = ParagraphStyle(
             'CustomTitle',
-            parent=styles['Heading1'],
+            parent=self.styles['Heading1'],
             fontSize=24,
             textColor=colors.HexColor('#2c3e50'),
             spaceAfter=30,
             alignment=TA_CENTER
         )
-        
-        heading_style = ParagraphStyle(
+
+        self.heading_style = ParagraphStyle(
             'CustomHeading',
-            parent=styles['Heading2'],
+            parent=self.styles['Heading2'],
             fontSize=16,
             textColor=colors.HexColor('#667eea'),
             spaceAfter=12,
             spaceBefore=12
         )
+
+        self.footer_style = ParagraphStyle(
+            'Footer',
+            parent=self.styles['Normal'],
+            fontSize=9,
+            textColor=colors.grey,
+            alignment=TA_CENTER
+        )
+
+        self._weather_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+
+        self._detection_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey)
+        ])
+
+        self._forecast_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#764ba2')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8f9fa')),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE')
+        ])
+
+    def build_pdf(self, weather_data=None, detection_result=None, forecast_data=None):
+        """
+        Build the report PDF in memory
+        Returns: (filename, pdf_bytes) — nothing touches disk
+        """
+        # Create filename with timestamp
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"pest_report_{timestamp}.pdf"
+        
+        # Create PDF document in an in-memory buffer
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=letter)
+        story = []
+        styles = self.styles
         
         # Title
-        title = Paragraph("🌾 Pest Infestation Report", title_style)
+        title = Paragraph("🌾 Pest Infestation Report", self.title_style)
         story.append(title)
         story.append(Spacer(1, 0.2*inch))
         
@@ -71,7 +117,7 @@ class PestReportGenerator:
         
         # Weather Section
         if weather_data:
-            story.append(Paragraph("🌦️ Weather Forecast (3 Days)", heading_style))
+            story.append(Paragraph("🌦️ Weather Forecast (3 Days)", self.heading_style))
             
             weather_table_data = [
                 ['Day', 'Temperature', 'Wind Speed', 'Risk Factor']
@@ -84,23 +130,14 @@ class PestReportGenerator:
                 weather_table_data.append([f"Day {day['day']}", temp, wind, risk])
             
             weather_table = Table(weather_table_data, colWidths=[1.5*inch, 2*inch, 2*inch, 1.5*inch])
-            weather_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
+            weather_table.setStyle(self._weather_table_style)
             
             story.append(weather_table)
             story.append(Spacer(1, 0.3*inch))
         
         # Detection Results
         if detection_result:
-            story.append(Paragraph("🐛 Pest Detection Results", heading_style))
+            story.append(Paragraph("🐛 Pest Detection Results", self.heading_style))
             
             classification = detection_result.get('classification', 'Unknown')
             probability = detection_result.get('pest_probability', 0) * 100
@@ -124,22 +161,14 @@ class PestReportGenerator:
             ]
             
             detection_table = Table(detection_data, colWidths=[3*inch, 4*inch])
-            detection_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-            ]))
+            detection_table.setStyle(self._detection_table_style)
             
             story.append(detection_table)
             story.append(Spacer(1, 0.3*inch))
         
         # Forecast Section
         if forecast_data:
-            story.append(Paragraph("📊 3-Day Pest Spread Forecast", heading_style))
+            story.append(Paragraph("📊 3-Day Pest Spread Forecast", self.heading_style))
             
             forecast_table_data = [
                 ['Day', 'Risk Level', 'Spread Probability', 'Recommended Action']
@@ -154,23 +183,13 @@ class PestReportGenerator:
                 forecast_table_data.append([day_num, risk, spread_prob, action])
             
             forecast_table = Table(forecast_table_data, colWidths=[1*inch, 1.5*inch, 1.5*inch, 3*inch])
-            forecast_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#764ba2')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8f9fa')),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE')
-            ]))
+            forecast_table.setStyle(self._forecast_table_style)
             
             story.append(forecast_table)
             story.append(Spacer(1, 0.3*inch))
         
         # Recommendations
-        story.append(Paragraph("💡 Recommendations", heading_style))
+        story.append(Paragraph("💡 Recommendations", self.heading_style))
         
         recommendations = [
             "• Monitor crop health daily for early pest detection",
@@ -188,18 +207,23 @@ class PestReportGenerator:
         
         # Footer
         footer_text = "Generated by Hyper-local Pest Infestation Forecaster | Developed for Precision Agriculture"
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=9,
-            textColor=colors.grey,
-            alignment=TA_CENTER
-        )
-        story.append(Paragraph(footer_text, footer_style))
+        story.append(Paragraph(footer_text, self.footer_style))
         
         # Build PDF
         doc.build(story)
         
+        return filename, buffer.getvalue()
+
+    def generate_report(self, weather_data=None, detection_result=None, forecast_data=None):
+        """
+        Generate comprehensive PDF report and save it to the reports dir
+        """
+        filename, pdf_bytes = self.build_pdf(weather_data, detection_result, forecast_data)
+        filepath = os.path.join(self.output_dir, filename)
+        
+        with open(filepath, 'wb') as f:
+            f.write(pdf_bytes)
+        
         print(f"✅ PDF Report generated: {filepath}")
         return filepath
 
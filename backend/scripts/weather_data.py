@@ -3,11 +3,13 @@ Weather Data Fetcher
 Fetches weather forecast from Open-Meteo API
 """
 
-import requests
+import httpx
 import json
+import numpy as np
 import os
 import sys
 from datetime import datetime
+from cachetools import TTLCache
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -19,16 +21,27 @@ class WeatherDataFetcher:
         self.api_url = Config.WEATHER_API
         self.lat = Config.FARM_LAT
         self.lon = Config.FARM_LON
+
+        # One client for the process: reuses the TCP/TLS connection to
+        # Open-Meteo instead of handshaking on every request
+        self._client = httpx.AsyncClient(timeout=10.0)
+        # Forecasts change hourly, not per API hit
+        self._cache = TTLCache(maxsize=4, ttl=900)
         
         # Create directories if they don't exist
         os.makedirs(Config.DATA_RAW, exist_ok=True)
         os.makedirs(Config.DATA_PROCESSED, exist_ok=True)
         
-    def fetch_forecast(self, days=3):
+    async def fetch_forecast(self, days=3):
         """
         Fetch weather forecast for next N days
         Returns: dict with temperature, wind_speed, precipitation
         """
+        cache_key = (self.lat, self.lon, days)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             print(f"🌍 Fetching weather for: Lat {self.lat}, Lon {self.lon}")
             
@@ -39,7 +52,7 @@ class WeatherDataFetcher:
                 'forecast_days': days
             }
             
-            response = requests.get(self.api_url, params=params)
+            response = await self._client.get(self.api_url, params=params)
             response.raise_for_status()
             
             data = response.json()
@@ -50,13 +63,14 @@ class WeatherDataFetcher:
                 json.dump(data, f, indent=2)
             
             print(f"✅ Weather data saved to: {output_path}")
+            self._cache[cache_key] = data
             return data
             
         except Exception as e:
             print(f"❌ Error fetching weather data: {e}")
             return None
     
-    def process_weather(self, weather_data):
+    def process_weather(self, weather_data, days=3):
         """
         Process weather data into simple daily averages
         """
@@ -65,23 +79,21 @@ class WeatherDataFetcher:
             
         try:
             hourly = weather_data['hourly']
-            temps = hourly['temperature_2m']
-            wind_speeds = hourly['wind_speed_10m']
             
-            # Calculate daily averages (24 hours = 1 day)
-            daily_stats = []
-            for day in range(3):
-                start_idx = day * 24
-                end_idx = start_idx + 24
-                
-                avg_temp = sum(temps[start_idx:end_idx]) / 24
-                avg_wind = sum(wind_speeds[start_idx:end_idx]) / 24
-                
-                daily_stats.append({
+            # Calculate daily averages in one reduction (24 hours = 1 day)
+            temps = np.asarray(hourly['temperature_2m'][:days * 24], dtype=np.float32)
+            winds = np.asarray(hourly['wind_speed_10m'][:days * 24], dtype=np.float32)
+            avg_temps = temps.reshape(days, 24).mean(axis=1)
+            avg_winds = winds.reshape(days, 24).mean(axis=1)
+            
+            daily_stats = [
+                {
                     'day': day + 1,
-                    'avg_temperature': round(avg_temp, 2),
-                    'avg_wind_speed': round(avg_wind, 2)
-                })
+                    'avg_temperature': round(float(avg_temps[day]), 2),
+                    'avg_wind_speed': round(float(avg_winds[day]), 2)
+                }
+                for day in range(days)
+            ]
             
             # Save processed data
             output_path = os.path.join(Config.DATA_PROCESSED, 'weather_processed.json')
@@ -98,6 +110,8 @@ class WeatherDataFetcher:
 
 # Test function
 if __name__ == "__main__":
+    import asyncio
+
     print("=" * 50)
     print("🌦️  Weather Data Fetcher Test")
     print("=" * 50)
@@ -105,7 +119,7 @@ if __name__ == "__main__":
     fetcher = WeatherDataFetcher()
     
     # Fetch forecast
-    weather_data = fetcher.fetch_forecast(days=3)
+    weather_data = asyncio.run(fetcher.fetch_forecast(days=3))
     
     if weather_data:
         # Process it